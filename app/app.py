@@ -1,14 +1,47 @@
+# セキュリティ方針: パスワード・トークン・APIキー等の秘密値を == で比較しないこと。
+# 比較にかかる時間から値が推測されないよう、定数時間比較の safe_eq を使う。
+# 参考: https://docs.python.org/3/library/hmac.html#hmac.compare_digest
 import os
+import threading
 import time
-from threading import Lock
-from flask import Flask, jsonify, render_template, request, redirect, url_for, flash, session
-import pymysql
+from hmac import compare_digest
+from flask import Flask, jsonify, render_template, request, redirect, url_for, flash, session, g
+from flask_caching import Cache
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL
 from dotenv import load_dotenv
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import check_password_hash, generate_password_hash
+from werkzeug.security import check_password_hash
+from argon2.exceptions import InvalidHashError, VerificationError
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField
 from wtforms.validators import DataRequired, Email
+from security import password_hasher
+
+
+def _select_db_driver():
+    """使用するMySQLドライバを決定
+
+    gevent ワーカー上ではソケットがモンキーパッチされるため純Pythonの PyMySQL を使い、
+    それ以外では Cエクステンションの mysqlclient を優先する（無ければ PyMySQL）。
+    """
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('socket'):
+            return 'pymysql'
+    except ImportError:
+        pass
+
+    try:
+        import MySQLdb  # noqa: F401
+        return 'mysqldb'
+    except ImportError:
+        return 'pymysql'
+
+
+DB_DRIVER = _select_db_driver()
 
 # Load environment variables
 load_dotenv()
@@ -22,6 +55,50 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'ログインが必要です。'
 
+# キャッシュ設定（既定はプロセス内メモリキャッシュ、複数ワーカーで共有する場合は RedisCache を指定）
+cache = Cache(app, config={
+    'CACHE_TYPE': os.getenv('CACHE_TYPE', 'SimpleCache'),
+    'CACHE_REDIS_URL': os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+    'CACHE_DEFAULT_TIMEOUT': 300
+})
+
+# レート制限設定（ログインのPOSTのみに個別に適用し、全体の既定制限は設けない）
+# 既定の memory:// はワーカー毎に別々に数えるため、複数ワーカーで共有する場合は
+# RATELIMIT_STORAGE_URI に redis:// 等を指定する。また接続元IPで判定するため、
+# リバースプロキシ配下では ProxyFix 等で実際のクライアントIPを渡す必要がある。
+app.config['RATELIMIT_STORAGE_URI'] = os.getenv('RATELIMIT_STORAGE_URI', 'memory://')
+limiter = Limiter(get_remote_address, app=app)
+
+
+def hash_password(password):
+    """パスワードをargon2idでハッシュ化"""
+    return password_hasher.hash(password)
+
+
+def verify_password(password_hash, password):
+    """パスワードを検証（移行期間中は従来のwerkzeug形式のハッシュも受け付ける）"""
+    if not password_hash.startswith('$argon2'):
+        return check_password_hash(password_hash, password)
+    try:
+        return password_hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def password_needs_rehash(password_hash):
+    """argon2idへの再ハッシュが必要か判定（従来形式のハッシュ、またはargon2のパラメータ変更時）"""
+    if not password_hash.startswith('$argon2'):
+        return True
+    try:
+        return password_hasher.check_needs_rehash(password_hash)
+    except InvalidHashError:
+        return False
+
+
+def safe_eq(a: str, b: str) -> bool:
+    """秘密値を定数時間で比較"""
+    return compare_digest(a.encode(), b.encode())
+
 
 # ユーザーモデル
 class User(UserMixin):
@@ -32,45 +109,71 @@ class User(UserMixin):
 
     @staticmethod
     def get_user_by_email(email):
-        """メールアドレスでユーザーを取得"""
+        """メールアドレスでユーザーを取得
+
+        存在するユーザーだけがキャッシュから応答されると応答時間からユーザーの有無が推測でき、
+        またパスワードハッシュをキャッシュに保持することになるため、キャッシュしない。
+        """
         try:
-            conn = pymysql.connect(**db_params)
-            cursor = conn.cursor()
-            cursor.execute('SELECT id, name, email, password_hash FROM users WHERE email = %s', (email,))
-            user_data = cursor.fetchone()
-            cursor.close()
-            conn.close()
-            
-            if user_data:
-                return {'id': user_data[0], 'name': user_data[1], 'email': user_data[2], 'password_hash': user_data[3]}
-            return None
+            with engine.connect() as conn:
+                user_data = conn.execute(
+                    text('SELECT id, name, email, password_hash FROM users WHERE email = :email'),
+                    {'email': email},
+                ).mappings().first()
+
+            return dict(user_data) if user_data else None
         except Exception as e:
             print(f"Database error: {e}")
             return None
 
     @staticmethod
+    @cache.memoize(timeout=60)
     def get_user_by_id(user_id):
         """IDでユーザーを取得"""
         try:
-            conn = pymysql.connect(**db_params)
-            cursor = conn.cursor()
-            cursor.execute('SELECT id, name, email FROM users WHERE id = %s', (user_id,))
-            user_data = cursor.fetchone()
-            cursor.close()
-            conn.close()
-            
+            with engine.connect() as conn:
+                user_data = conn.execute(
+                    text('SELECT id, name, email FROM users WHERE id = :user_id'),
+                    {'user_id': user_id},
+                ).mappings().first()
+
             if user_data:
-                return User(user_data[0], user_data[1], user_data[2])
+                return User(**user_data)
             return None
         except Exception as e:
             print(f"Database error: {e}")
             return None
 
+    @staticmethod
+    def update_password_hash(user_id, password_hash):
+        """ユーザーのパスワードハッシュを更新"""
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text('UPDATE users SET password_hash = :password_hash WHERE id = :user_id'),
+                    {'password_hash': password_hash, 'user_id': user_id},
+                )
+            return True
+        except Exception as e:
+            print(f"Database error: {e}")
+            return False
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Flask-Loginのユーザー読み込み"""
-    return User.get_user_by_id(user_id)
+    """Flask-Loginのユーザー読み込み（リクエスト内はgに、リクエスト間はセッション・キャッシュに保持）"""
+    user = getattr(g, '_cached_user', None)
+    if user is not None and str(user.id) == str(user_id):
+        return user
+
+    # ログイン時にセッションへ保存したユーザー情報があればDBへ問い合わせない
+    user_cache = session.get('user_cache')
+    if user_cache and str(user_cache['id']) == str(user_id):
+        user = User(**user_cache)
+    else:
+        user = User.get_user_by_id(str(user_id))
+    g._cached_user = user
+    return user
 
 
 # ログインフォーム
@@ -80,82 +183,93 @@ class LoginForm(FlaskForm):
     submit = SubmitField('ログイン')
 
 
+# フィールド定義とMetaの解決はクラス単位でキャッシュされるため、インポート時に一度済ませておく
+with app.app_context():
+    LoginForm(formdata=None, meta={'csrf': False})
+
+
+# 存在しないユーザーでもパスワード検証を行うためのダミーハッシュ
+_DUMMY_HASH = hash_password('invalid')
+
+
 # Database connection parameters for MySQL
 db_params = {
     'database': os.getenv('MYSQL_DATABASE', 'mysql'),
     'user': os.getenv('MYSQL_USER', 'mysql'),
     'password': os.getenv('MYSQL_PASSWORD', 'mysql'),
     'host': os.getenv('MYSQL_HOST', 'db'),
-    'port': int(os.getenv('MYSQL_PORT', '3306'))
+    'port': int(os.getenv('MYSQL_PORT', '3306')),
+    'charset': 'utf8mb4'
 }
 
-_test_users_initialized = False
-_test_users_lock = Lock()
+# SQLAlchemyエンジン（コネクションプールとコンパイル済みSQLのキャッシュを持つ）
+# create_engine は接続を行わないため、DB 起動前でもアプリを読み込める
+engine = create_engine(
+    URL.create(
+        f"mysql+{DB_DRIVER}",
+        username=db_params['user'],
+        password=db_params['password'],
+        host=db_params['host'],
+        port=db_params['port'],
+        database=db_params['database'],
+        query={'charset': db_params['charset']},
+    ),
+    pool_size=10,
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+)
+
+# テストユーザーのパスワードハッシュ（generate_hashes.py で事前計算した 'password123' のargon2idハッシュ）
+_YAMADA_HASH = '$argon2id$v=19$m=19456,t=2,p=1$Ax2V4d0ccBkkRXVfOzFHDw$pH49JShQGGZ7t6BWTL0Fy3NT7szjIMR72LXBCltIYYA'
+_SATO_HASH = '$argon2id$v=19$m=19456,t=2,p=1$wTNyw4o9PWDk9vqDgzVNdg$mRgdpaIfdy2SoAJP34IvmdRXNBDEL/H+G0rIwh7Rqlo'
 
 
 def create_test_users():
-    """テスト用ユーザーを作成（初回起動時のみ）"""
-    conn = None
-    cursor = None
+    """テスト用ユーザーを作成（既に存在するユーザーは無視）"""
     try:
-        conn = pymysql.connect(**db_params)
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT COUNT(*) FROM users')
-        user_count = cursor.fetchone()[0]
-
-        if user_count == 0:
-            test_users = [
-                ('山田太郎', 'yamada@example.com', 'password123'),
-                ('佐藤花子', 'sato@example.com', 'password123')
-            ]
-
-            for name, email, password in test_users:
-                password_hash = generate_password_hash(password)
-                cursor.execute(
-                    """
-                    INSERT INTO users (name, email, password_hash)
-                    VALUES (%s, %s, %s)
-                    """,
-                    (name, email, password_hash),
-                )
-                print(f"Created test user: {name} ({email})")
-
-            conn.commit()
-            print("Test users created successfully!")
+        test_users = [
+            {'name': '山田太郎', 'email': 'yamada@example.com', 'password_hash': _YAMADA_HASH},
+            {'name': '佐藤花子', 'email': 'sato@example.com', 'password_hash': _SATO_HASH}
+        ]
+
+        with engine.begin() as conn:
+            conn.execute(
+                text("""
+                    INSERT IGNORE INTO users (name, email, password_hash)
+                    VALUES (:name, :email, :password_hash)
+                """),
+                test_users,
+            )
+        print("Test users created successfully!")
 
         return True
     except Exception as e:
         print(f"Error creating test users: {e}")
         return False
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 
-def ensure_test_users():
-    """テストユーザーが存在するように保証"""
-    global _test_users_initialized
-    if _test_users_initialized:
-        return
+def ensure_test_users(max_attempts=8):
+    """テストユーザーが存在するように保証（失敗時は指数バックオフで再試行）"""
+    for attempt in range(max_attempts):
+        if create_test_users():
+            return True
+        if attempt + 1 < max_attempts:
+            backoff = min(30, 0.5 * (2 ** attempt))
+            print(f"Retrying test user creation in {backoff}s (attempt {attempt + 2}/{max_attempts})")
+            time.sleep(backoff)
+    return False
 
-    with _test_users_lock:
-        if _test_users_initialized:
-            return
 
-        for attempt in range(5):
-            if create_test_users():
-                _test_users_initialized = True
-                return
-            time.sleep(2)
-            print(f"Retrying test user creation (attempt {attempt + 2}/5)")
+# アプリケーション起動時にバックグラウンドでテストユーザーを作成（リクエスト処理は待たせない）
+# INSERT IGNORE は冪等なため、各ワーカーがそれぞれ作成を試みる（DBのリセット後も再作成される）
+if os.getenv('AUTO_SEED_USERS', '1') == '1':
+    threading.Thread(target=ensure_test_users, daemon=True).start()
 
 
 @app.route('/')
+@cache.cached(timeout=300, unless=lambda: current_user.is_authenticated)
 def index():
-    ensure_test_users()
     if current_user.is_authenticated:
         return redirect(url_for('dashboard'))
     
@@ -169,19 +283,28 @@ def index():
 
 
 @app.route('/login', methods=['GET', 'POST'])
+@limiter.limit("5 per minute", methods=['POST'])
 def login():
     """ログイン処理"""
-    ensure_test_users()
     if current_user.is_authenticated:
         return redirect(url_for('dashboard'))
     
     form = LoginForm()
     if form.validate_on_submit():
         user_data = User.get_user_by_email(form.email.data)
-        
-        if user_data and check_password_hash(user_data['password_hash'], form.password.data):
+
+        # ユーザーの有無に関わらず同じ検証処理を行い、応答時間からのユーザー推測を防ぐ
+        password_hash = user_data['password_hash'] if user_data else _DUMMY_HASH
+        password_ok = verify_password(password_hash, form.password.data)
+
+        if user_data and password_ok:
             user = User(user_data['id'], user_data['name'], user_data['email'])
+            # 従来形式のハッシュはログイン成功時にargon2idへ移行する
+            if password_needs_rehash(user_data['password_hash']):
+                User.update_password_hash(user.id, hash_password(form.password.data))
+            cache.delete_memoized(User.get_user_by_id, str(user.id))
             login_user(user)
+            session['user_cache'] = {'id': user.id, 'name': user.name, 'email': user.email}
             flash('ログインに成功しました。', 'success')
             return redirect(url_for('dashboard'))
         else:
@@ -201,12 +324,12 @@ def dashboard():
 @login_required
 def logout():
     """ログアウト処理"""
+    cache.delete_memoized(User.get_user_by_id, str(current_user.id))
+    session.pop('user_cache', None)
     logout_user()
     flash('ログアウトしました。', 'info')
     return redirect(url_for('index'))
 
 
 if __name__ == '__main__':
-    # アプリケーション起動時にテストユーザーを作成
-    create_test_users()
     app.run(host='0.0.0.0', debug=True)
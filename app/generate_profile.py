@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+プロファイリング用にアプリケーションを起動するスクリプト
+
+Werkzeug の ProfilerMiddleware でリクエスト毎の cProfile 結果を出力します。
+標準出力には累積時間の上位30件を表示し、詳細は PROFILE_DIR に .prof ファイルとして保存します。
+
+    python generate_profile.py
+    snakeviz profiles/*.prof
+"""
+import os
+
+from werkzeug.middleware.profiler import ProfilerMiddleware
+
+from app import app
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', './profiles')
+PROFILE_PORT = int(os.getenv('PROFILE_PORT', '5001'))
+
+
+if __name__ == '__main__':
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, restrictions=[30], profile_dir=PROFILE_DIR)
+    app.run(host='0.0.0.0', port=PROFILE_PORT)
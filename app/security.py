@@ -0,0 +1,10 @@
+"""
+パスワードハッシュの共通設定
+
+アプリケーション（app.py）とテストユーザー作成用のスクリプトで同じパラメータを使うため、
+Flaskアプリを読み込まずにインポートできるモジュールとして分けている。
+"""
+from argon2 import PasswordHasher
+
+# パスワードハッシュ設定（argon2id）
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
@@ -3,8 +3,14 @@
 データベース初期化時にテストユーザーを作成するスクリプト
 """
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
 import pymysql
-from werkzeug.security import generate_password_hash
+
+# アプリケーションと同じパラメータでハッシュ化するため app/security.py の password_hasher を使う
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+from security import password_hasher  # noqa: E402
 
 # データベース接続パラメータ
 db_params = {
@@ -12,35 +18,42 @@ db_params = {
     'user': os.getenv('MYSQL_USER', 'mysql'),
     'password': os.getenv('MYSQL_PASSWORD', 'mysql'),
     'host': os.getenv('MYSQL_HOST', 'db'),
-    'port': int(os.getenv('MYSQL_PORT', '3306'))
+    'port': int(os.getenv('MYSQL_PORT', '3306')),
+    'charset': 'utf8mb4'
 }
 
+
 def create_test_users():
     """テスト用ユーザーを作成"""
     try:
-        # データベース接続
-        conn = pymysql.connect(**db_params)
-        cursor = conn.cursor()
-        
         # テストユーザーのデータ
         test_users = [
             ('山田太郎', 'yamada@example.com', 'password123'),
             ('佐藤花子', 'sato@example.com', 'password123')
         ]
         
-        for name, email, password in test_users:
-            # パスワードハッシュを生成
-            password_hash = generate_password_hash(password)
-            
-            # ユーザーを挿入（既存の場合は無視）
-            cursor.execute("""
-                INSERT IGNORE INTO users (name, email, password_hash) 
-                VALUES (%s, %s, %s)
-            """, (name, email, password_hash))
-            
-            print(f"Created user: {name} ({email})")
+        # パスワードハッシュを並列に生成（ハッシュ計算中はGILが解放される）
+        with ThreadPoolExecutor() as executor:
+            password_hashes = list(executor.map(password_hasher.hash, [password for _, _, password in test_users]))
+        rows = [
+            (name, email, password_hash)
+            for (name, email, _), password_hash in zip(test_users, password_hashes)
+        ]
+        
+        # データベース接続（1文の一括INSERTのみのため自動コミット）
+        conn = pymysql.connect(autocommit=True, **db_params)
+        cursor = conn.cursor()
+        
+        # ユーザーを一括挿入（既存の場合は無視）
+        cursor.executemany("""
+            INSERT IGNORE INTO users (name, email, password_hash) 
+            VALUES (%s, %s, %s)
+        """, rows)
+        
+        # INSERT IGNORE で既存ユーザーはスキップされるため、実際に挿入された件数を報告する
+        created = cursor.rowcount
+        print(f"Created {created} user(s), skipped {len(rows) - created} existing user(s)")
         
-        conn.commit()
         cursor.close()
         conn.close()
         print("Test users created successfully!")
@@ -48,5 +61,6 @@ def create_test_users():
     except Exception as e:
         print(f"Error creating test users: {e}")
 
+
 if __name__ == "__main__":
-    create_test_users()
\ No newline at end of file
+    create_test_users()
@@ -13,7 +13,10 @@ CREATE TABLE IF NOT EXISTS users (
     email VARCHAR(255) UNIQUE NOT NULL,
     password_hash VARCHAR(255) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    -- ログイン時の検索（WHERE email = ?）をインデックスのみで完結させるカバリングインデックス
+    -- InnoDB のセカンダリインデックスには主キー (id) が暗黙的に含まれる
+    INDEX idx_users_email_login (email, name, password_hash)
 );
 
 -- テストユーザーはアプリケーション起動時に自動的に作成されます
@@ -1,22 +1,30 @@
 #!/usr/bin/env python3
 """
 テスト用ユーザーのパスワードハッシュを生成するスクリプト
+
+出力された定数を app/app.py の _YAMADA_HASH / _SATO_HASH に貼り付けることで、
+アプリ起動時のハッシュ計算を省略できます。
 """
-from werkzeug.security import generate_password_hash
+import os
+import sys
+
+# アプリケーションと同じパラメータでハッシュ化するため app/security.py の password_hasher を使う
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+from security import password_hasher  # noqa: E402
 
 # テスト用パスワード
 password = "password123"
 
 # パスワードハッシュを生成
-hash1 = generate_password_hash(password)
-hash2 = generate_password_hash(password)
+hash1 = password_hasher.hash(password)
+hash2 = password_hasher.hash(password)
 
 print("Generated password hashes for 'password123':")
-print(f"User 1 hash: {hash1}")
-print(f"User 2 hash: {hash2}")
+print(f"_YAMADA_HASH = '{hash1}'")
+print(f"_SATO_HASH = '{hash2}'")
 
 # SQL用のINSERT文を生成
 print("\nSQL INSERT statements:")
 print(f"INSERT IGNORE INTO users (name, email, password_hash) VALUES")
 print(f"('山田太郎', 'yamada@example.com', '{hash1}'),")
-print(f"('佐藤花子', 'sato@example.com', '{hash2}');")
\ No newline at end of file
+print(f"('佐藤花子', 'sato@example.com', '{hash2}');")
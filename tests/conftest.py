@@ -0,0 +1,65 @@
+"""
+テスト全体で共有するフィクスチャ
+"""
+import functools
+import os
+import sys
+
+import pytest
+import werkzeug.security
+
+# テスト実行時はアプリ読み込み時のテストユーザー作成（DB接続）を行わない
+os.environ.setdefault('AUTO_SEED_USERS', '0')
+
+# テスト用のパスワードハッシュ方式（本番より大幅に軽量。TEST_HASH_METHOD で変更可能）
+HASH_METHOD = os.environ.get('TEST_HASH_METHOD', 'pbkdf2:sha256:1')
+
+
+@pytest.fixture(autouse=True)
+def _clear_app_cache():
+    """テスト間でアプリケーションのキャッシュが持ち越されないようにする"""
+    yield
+    app_module = sys.modules.get('app')
+    if app_module is not None and hasattr(app_module, 'cache'):
+        app_module.cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _disable_rate_limit():
+    """テストではレート制限を無効化（レート制限自体のテストでは個別に有効化する）"""
+    app_module = sys.modules.get('app')
+    if app_module is not None and hasattr(app_module, 'limiter'):
+        app_module.limiter.enabled = False
+    yield
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_password_hash(password):
+    """軽量な HASH_METHOD と短いソルトでハッシュ化（パスワードごとに一度だけ計算）"""
+    return werkzeug.security.generate_password_hash(password, method=HASH_METHOD, salt_length=4)
+
+
+@pytest.fixture(scope='session')
+def hash_method():
+    """テスト用のパスワードハッシュ方式"""
+    return HASH_METHOD
+
+
+@pytest.fixture(scope='session')
+def make_password_hash():
+    """テスト用のパスワードハッシュを返す関数（本番では使用しないこと）"""
+    return _cached_password_hash
+
+
+@pytest.fixture(autouse=True, scope='session')
+def _cached_password_check():
+    """テストセッション中はアプリの従来形式ハッシュの検証（app.check_password_hash）をメモ化する"""
+    app_module = sys.modules.get('app')
+    if app_module is None or not hasattr(app_module, 'check_password_hash'):
+        yield
+        return
+
+    cached_check_password_hash = functools.lru_cache(maxsize=1024)(app_module.check_password_hash)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(app_module, 'check_password_hash', cached_check_password_hash)
+        yield
@@ -6,30 +6,36 @@
 - データベースとの統合テスト
 - ユーザーの実際の操作フローをシミュレート
 """
+import concurrent.futures
 import os
 import time
-import urllib.error
-import urllib.request
-import json
 import pytest
+import requests
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
+# Seleniumサーバーの同時セッション数は1のため、ブラウザテストは同じプロセスで実行する
+pytestmark = pytest.mark.xdist_group("browser")
+
 
 def _wait_for_http(url: str, timeout: int = 60, expect_json: bool = False) -> bool:
-    """指定されたURLが応答するまで待機"""
+    """指定されたURLが応答するまで待機（接続を再利用し、間隔を徐々に広げながらポーリング）"""
     deadline = time.time() + timeout
-    while time.time() < deadline:
-        try:
-            with urllib.request.urlopen(url) as response:
+    attempt = 0
+    with requests.Session() as http:
+        while time.time() < deadline:
+            try:
+                response = http.get(url, timeout=5)
+                response.raise_for_status()
                 if expect_json:
-                    json.loads(response.read().decode("utf-8"))
+                    response.json()
                 return True
-        except (urllib.error.URLError, urllib.error.HTTPError, json.JSONDecodeError):
-            time.sleep(2)
+            except (requests.RequestException, ValueError):
+                time.sleep(min(2.0, 0.1 * 1.5 ** attempt))
+                attempt += 1
     return False
 
 
@@ -46,11 +52,15 @@ def settings():
 def driver(settings):
     """Seleniumドライバー"""
     selenium_status = settings["selenium_url"].split("/wd/hub", 1)[0] + "/status"
-    if not _wait_for_http(selenium_status, expect_json=True):
-        pytest.skip("Selenium server is not reachable; skipping E2E tests.")
 
-    # アプリが到達可能になるまで待機
-    if not _wait_for_http(settings["app_url"]):
+    # Seleniumとアプリが到達可能になるまで並行して待機
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        selenium_ready = executor.submit(_wait_for_http, selenium_status, expect_json=True)
+        app_ready = executor.submit(_wait_for_http, settings["app_url"])
+
+    if not selenium_ready.result():
+        pytest.skip("Selenium server is not reachable; skipping E2E tests.")
+    if not app_ready.result():
         pytest.skip("Flask app is not reachable; skipping E2E tests.")
 
     options = webdriver.ChromeOptions()
@@ -68,6 +78,45 @@ def driver(settings):
     driver.quit()
 
 
+@pytest.fixture(scope="session")
+def _login_cookies():
+    """ログイン済みセッションのCookie（メールアドレス毎に保持）"""
+    return {}
+
+
+@pytest.fixture
+def logged_in_driver(driver, settings, _login_cookies):
+    """ログイン済みのドライバーを返す関数
+
+    ログインフォームからのログインはユーザー毎に一度だけ行い、
+    以降のテストでは保存したCookieを復元してダッシュボードを開く。
+    """
+    def _login(email, password="password123"):
+        if email in _login_cookies:
+            # Cookieを設定するためにアプリのドメインを開いておく
+            driver.get(settings["app_url"])
+            driver.delete_all_cookies()
+            for cookie in _login_cookies[email]:
+                driver.add_cookie({key: cookie[key] for key in ("name", "value", "path") if key in cookie})
+            driver.get(f"{settings['app_url']}/dashboard")
+        else:
+            driver.delete_all_cookies()
+            driver.get(f"{settings['app_url']}/login")
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.NAME, "email"))
+            )
+            driver.find_element(By.NAME, "email").send_keys(email)
+            driver.find_element(By.NAME, "password").send_keys(password)
+            driver.find_element(By.CSS_SELECTOR, "input[type='submit']").click()
+            WebDriverWait(driver, 10).until(EC.url_contains("/dashboard"))
+            _login_cookies[email] = driver.get_cookies()
+        return driver
+
+    yield _login
+    # 後続のテストにログイン状態を持ち越さない
+    driver.delete_all_cookies()
+
+
 class TestCompleteAuthenticationFlow:
     """完全な認証フローのE2Eテスト"""
     
@@ -203,24 +252,11 @@ class TestCompleteAuthenticationFlow:
 class TestDashboardFeatures:
     """ダッシュボード機能のE2Eテスト"""
     
-    def test_dashboard_user_information_display(self, driver, settings):
+    def test_dashboard_user_information_display(self, driver, logged_in_driver):
         """ダッシュボードでのユーザー情報表示テスト"""
         
-        # ログインページに移動してログイン
-        driver.get(f"{settings['app_url']}/login")
-        
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.NAME, "email"))
-        )
-        
-        email_field = driver.find_element(By.NAME, "email")
-        password_field = driver.find_element(By.NAME, "password")
-        
-        email_field.send_keys("sato@example.com")
-        password_field.send_keys("password123")
-        
-        login_button = driver.find_element(By.CSS_SELECTOR, "input[type='submit']")
-        login_button.click()
+        # ログイン済みの状態でダッシュボードを開く
+        logged_in_driver("sato@example.com")
         
         # ダッシュボードでユーザー情報を確認
         WebDriverWait(driver, 10).until(
@@ -236,19 +272,11 @@ class TestDashboardFeatures:
         assert "メールアドレスとパスワードでのログイン認証" in feature_list.text
         assert "ユーザー情報の表示" in feature_list.text
     
-    def test_dashboard_navigation_links(self, driver, settings):
+    def test_dashboard_navigation_links(self, driver, logged_in_driver):
         """ダッシュボードのナビゲーションリンクテスト"""
         
-        # ログイン処理
-        driver.get(f"{settings['app_url']}/login")
-        
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.NAME, "email"))
-        )
-        
-        driver.find_element(By.NAME, "email").send_keys("yamada@example.com")
-        driver.find_element(By.NAME, "password").send_keys("password123")
-        driver.find_element(By.CSS_SELECTOR, "input[type='submit']").click()
+        # ログイン済みの状態でダッシュボードを開く
+        logged_in_driver("yamada@example.com")
         
         # ダッシュボードでリンクを確認
         WebDriverWait(driver, 10).until(
@@ -277,19 +305,11 @@ class TestSecurityFeatures:
         assert "ログイン" in driver.page_source
         assert driver.current_url.endswith("/login")
     
-    def test_session_persistence(self, driver, settings):
+    def test_session_persistence(self, driver, settings, logged_in_driver):
         """セッション持続性のテスト"""
         
-        # ログイン
-        driver.get(f"{settings['app_url']}/login")
-        
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.NAME, "email"))
-        )
-        
-        driver.find_element(By.NAME, "email").send_keys("yamada@example.com")
-        driver.find_element(By.NAME, "password").send_keys("password123")
-        driver.find_element(By.CSS_SELECTOR, "input[type='submit']").click()
+        # ログイン済みの状態でダッシュボードを開く
+        logged_in_driver("yamada@example.com")
         
         # ダッシュボードに到達
         WebDriverWait(driver, 10).until(
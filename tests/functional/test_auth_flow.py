@@ -15,8 +15,11 @@ from unittest.mock import patch, MagicMock
 # アプリケーションのパスを追加
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../app'))
 
-from app import app, User
-from werkzeug.security import generate_password_hash
+from app import app, User, _DUMMY_HASH, limiter, hash_password
+from flask import render_template
+
+# テストで使うパスワード（ハッシュは make_password_hash フィクスチャで一度だけ計算される）
+_PW = "password123"
 
 
 @pytest.fixture
@@ -26,9 +29,11 @@ def client():
     app.config['WTF_CSRF_ENABLED'] = False  # CSRFを無効化（テスト用）
     app.config['SECRET_KEY'] = 'test_secret_key'
     
-    with app.test_client() as client:
-        with app.app_context():
-            yield client
+    # ログイン時のハッシュ移行でDBへ書き込まないようにする
+    with patch('app.User.update_password_hash', return_value=True):
+        with app.test_client() as client:
+            with app.app_context():
+                yield client
 
 
 class TestLoginFunctionality:
@@ -43,11 +48,11 @@ class TestLoginFunctionality:
         assert 'パスワード' in response.get_data(as_text=True)
     
     @patch('app.User.get_user_by_email')
-    def test_login_success(self, mock_get_user, client):
+    def test_login_success(self, mock_get_user, client, make_password_hash):
         """ログイン成功テスト"""
         # テストユーザーのモックデータ
-        password = "password123"
-        password_hash = generate_password_hash(password)
+        password = _PW
+        password_hash = make_password_hash(_PW)
         
         mock_get_user.return_value = {
             'id': 1,
@@ -79,11 +84,28 @@ class TestLoginFunctionality:
         
         assert response.status_code == 200
         assert 'メールアドレスまたはパスワードが正しくありません' in response.get_data(as_text=True)
-    
+
+    @patch('app.verify_password')
+    @patch('app.User.get_user_by_email')
+    def test_login_invalid_email_still_verifies_password(self, mock_get_user, mock_verify, client):
+        """存在しないメールアドレスでもパスワード検証が行われることのテスト（タイミング攻撃対策）"""
+        mock_get_user.return_value = None
+        mock_verify.return_value = True
+
+        response = client.post('/login', data={
+            'email': 'nonexistent@example.com',
+            'password': 'password123'
+        })
+
+        # ダミーハッシュで検証が行われ、ログインは失敗する
+        mock_verify.assert_called_once_with(_DUMMY_HASH, 'password123')
+        assert response.status_code == 200
+        assert 'メールアドレスまたはパスワードが正しくありません' in response.get_data(as_text=True)
+
     @patch('app.User.get_user_by_email')
-    def test_login_invalid_password(self, mock_get_user, client):
+    def test_login_invalid_password(self, mock_get_user, client, make_password_hash):
         """間違ったパスワードでのログインテスト"""
-        password_hash = generate_password_hash("correct_password")
+        password_hash = make_password_hash("correct_password")
         
         mock_get_user.return_value = {
             'id': 1,
@@ -100,6 +122,75 @@ class TestLoginFunctionality:
         assert response.status_code == 200
         assert 'メールアドレスまたはパスワードが正しくありません' in response.get_data(as_text=True)
     
+    @patch('app.User.get_user_by_email')
+    def test_login_rate_limited(self, mock_get_user, client):
+        """短時間に繰り返しログインを試行するとレート制限されることのテスト"""
+        mock_get_user.return_value = None
+        limiter.enabled = True
+        limiter.reset()
+
+        try:
+            for _ in range(5):
+                response = client.post('/login', data={
+                    'email': 'nonexistent@example.com',
+                    'password': 'password123'
+                })
+                assert response.status_code == 200
+
+            # 6回目は拒否される
+            response = client.post('/login', data={
+                'email': 'nonexistent@example.com',
+                'password': 'password123'
+            })
+            assert response.status_code == 429
+
+            # ページの表示（GET）は制限されない
+            assert client.get('/login').status_code == 200
+        finally:
+            limiter.reset()
+
+    @patch('app.User.update_password_hash')
+    @patch('app.User.get_user_by_email')
+    def test_login_rehashes_legacy_password_hash(self, mock_get_user, mock_update, client, make_password_hash):
+        """従来形式のハッシュのユーザーはログイン成功時にargon2idへ再ハッシュされることのテスト"""
+        mock_get_user.return_value = {
+            'id': 1,
+            'name': 'テストユーザー',
+            'email': 'test@example.com',
+            'password_hash': make_password_hash(_PW)
+        }
+        mock_update.return_value = True
+
+        response = client.post('/login', data={
+            'email': 'test@example.com',
+            'password': _PW
+        })
+
+        assert response.status_code == 302
+        mock_update.assert_called_once()
+        user_id, new_hash = mock_update.call_args[0]
+        assert user_id == 1
+        assert new_hash.startswith('$argon2id$')
+
+    @patch('app.User.update_password_hash')
+    @patch('app.User.get_user_by_email')
+    def test_login_does_not_rehash_argon2_password_hash(self, mock_get_user, mock_update, client):
+        """argon2idのハッシュのユーザーは再ハッシュされないことのテスト"""
+        mock_get_user.return_value = {
+            'id': 1,
+            'name': 'テストユーザー',
+            'email': 'test@example.com',
+            'password_hash': hash_password(_PW)
+        }
+
+        response = client.post('/login', data={
+            'email': 'test@example.com',
+            'password': _PW
+        })
+
+        assert response.status_code == 302
+        mock_update.assert_not_called()
+
     def test_login_form_validation(self, client):
         """ログインフォームのバリデーションテスト"""
         # 空のフォーム送信
@@ -137,10 +228,10 @@ class TestDashboardAccess:
     
     @patch('app.User.get_user_by_id')
     @patch('app.User.get_user_by_email')
-    def test_dashboard_access_with_login(self, mock_get_by_email, mock_get_by_id, client):
+    def test_dashboard_access_with_login(self, mock_get_by_email, mock_get_by_id, client, make_password_hash):
         """ログイン後のダッシュボードアクセステスト"""
-        password = "password123"
-        password_hash = generate_password_hash(password)
+        password = _PW
+        password_hash = make_password_hash(_PW)
         
         # ログイン用のモック
         mock_get_by_email.return_value = {
@@ -165,16 +256,37 @@ class TestDashboardAccess:
         assert 'ダッシュボード' in response.get_data(as_text=True)
         assert 'テストユーザー' in response.get_data(as_text=True)
 
+    @patch('app.User.get_user_by_id')
+    @patch('app.User.get_user_by_email')
+    def test_dashboard_uses_session_user_cache(self, mock_get_by_email, mock_get_by_id, client, make_password_hash):
+        """ログイン後はセッションのユーザー情報を使いDBへ問い合わせないことのテスト"""
+        mock_get_by_email.return_value = {
+            'id': 1,
+            'name': 'テストユーザー',
+            'email': 'test@example.com',
+            'password_hash': make_password_hash(_PW)
+        }
+
+        client.post('/login', data={
+            'email': 'test@example.com',
+            'password': 'password123'
+        })
+
+        response = client.get('/dashboard')
+        assert response.status_code == 200
+        assert 'テストユーザー' in response.get_data(as_text=True)
+        mock_get_by_id.assert_not_called()
+
 
 class TestLogoutFunctionality:
     """ログアウト機能のテスト"""
     
     @patch('app.User.get_user_by_id')
     @patch('app.User.get_user_by_email')
-    def test_logout(self, mock_get_by_email, mock_get_by_id, client):
+    def test_logout(self, mock_get_by_email, mock_get_by_id, client, make_password_hash):
         """ログアウト機能テスト"""
-        password = "password123"
-        password_hash = generate_password_hash(password)
+        password = _PW
+        password_hash = make_password_hash(_PW)
         
         # ログイン用のモック
         mock_get_by_email.return_value = {
@@ -204,6 +316,10 @@ class TestLogoutFunctionality:
         dashboard_response = client.get('/dashboard', follow_redirects=True)
         assert 'ログイン' in dashboard_response.get_data(as_text=True)
 
+        # セッションのユーザー情報が破棄されていることを確認
+        with client.session_transaction() as sess:
+            assert 'user_cache' not in sess
+
 
 class TestIndexPageBehavior:
     """インデックスページの動作テスト"""
@@ -214,13 +330,49 @@ class TestIndexPageBehavior:
         assert response.status_code == 200
         assert 'Welcome to Flask with MySQL' in response.get_data(as_text=True)
         assert 'ログイン' in response.get_data(as_text=True)
+
+    def test_index_page_cached_for_anonymous(self, client):
+        """未ログイン時のインデックスページがキャッシュされることのテスト"""
+        with patch('app.render_template', wraps=render_template) as mock_render:
+            first = client.get('/')
+            second = client.get('/')
+
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert first.data == second.data
+        # 2回目はキャッシュから返されテンプレートは描画されない
+        assert mock_render.call_count == 1
+
+    @patch('app.User.get_user_by_id')
+    @patch('app.User.get_user_by_email')
+    def test_index_page_cache_not_used_when_logged_in(self, mock_get_by_email, mock_get_by_id, client, make_password_hash):
+        """未ログイン時のキャッシュがあってもログイン済みならリダイレクトされることのテスト"""
+        mock_get_by_email.return_value = {
+            'id': 1,
+            'name': 'テストユーザー',
+            'email': 'test@example.com',
+            'password_hash': make_password_hash(_PW)
+        }
+        mock_get_by_id.return_value = User(1, 'テストユーザー', 'test@example.com')
+
+        # 未ログイン状態でキャッシュを作成
+        client.get('/')
+
+        # ログイン後はダッシュボードへリダイレクト
+        client.post('/login', data={
+            'email': 'test@example.com',
+            'password': 'password123'
+        })
+        response = client.get('/')
+        assert response.status_code == 302
+        assert response.headers['Location'].endswith('/dashboard')
     
     @patch('app.User.get_user_by_id')
     @patch('app.User.get_user_by_email')
-    def test_index_page_with_login_redirects_to_dashboard(self, mock_get_by_email, mock_get_by_id, client):
+    def test_index_page_with_login_redirects_to_dashboard(self, mock_get_by_email, mock_get_by_id, client, make_password_hash):
         """ログイン済みの場合、インデックスページからダッシュボードにリダイレクト"""
-        password = "password123"
-        password_hash = generate_password_hash(password)
+        password = _PW
+        password_hash = make_password_hash(_PW)
         
         mock_get_by_email.return_value = {
             'id': 1,
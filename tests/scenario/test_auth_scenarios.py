@@ -10,7 +10,6 @@
 import pytest
 import sys
 import os
-import time
 import concurrent.futures
 from unittest.mock import patch, MagicMock
 
@@ -18,7 +17,14 @@ from unittest.mock import patch, MagicMock
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../app'))
 
 from app import app, User
-from werkzeug.security import generate_password_hash
+
+
+# レスポンス本文をデコードせずに検索するためのバイト列
+DASHBOARD_B = 'ダッシュボード'.encode('utf-8')
+WELCOME_B = b'Welcome to Flask with MySQL'
+LOGIN_JP_B = 'ログイン'.encode('utf-8')
+AUTH_FAIL_B = 'メールアドレスまたはパスワードが正しくありません'.encode('utf-8')
+INVALID_EMAIL_B = b'Invalid email address'
 
 
 @pytest.fixture
@@ -28,17 +34,29 @@ def client():
     app.config['WTF_CSRF_ENABLED'] = False
     app.config['SECRET_KEY'] = 'test_secret_key'
     
-    with app.test_client() as client:
-        with app.app_context():
-            yield client
+    # ログイン時のハッシュ移行でDBへ書き込まないようにする
+    with patch('app.User.update_password_hash', return_value=True):
+        with app.test_client() as client:
+            with app.app_context():
+                yield client
+
+
+class MockedUserLookupMixin:
+    """ユーザー取得処理（get_user_by_email / get_user_by_id）をテスト毎にモックするMixin"""
+    
+    @pytest.fixture(autouse=True)
+    def _mock_user_lookup(self):
+        with patch('app.User.get_user_by_email') as mock_get_by_email, \
+             patch('app.User.get_user_by_id') as mock_get_by_id:
+            self.mock_get_by_email = mock_get_by_email
+            self.mock_get_by_id = mock_get_by_id
+            yield
 
 
-class TestNewUserDailyWorkflow:
+class TestNewUserDailyWorkflow(MockedUserLookupMixin):
     """新規ユーザーの一日の利用ワークフロー"""
     
-    @patch('app.User.get_user_by_id')
-    @patch('app.User.get_user_by_email')
-    def test_typical_user_daily_workflow(self, mock_get_by_email, mock_get_by_id, client):
+    def test_typical_user_daily_workflow(self, client, make_password_hash):
         """典型的なユーザーの一日の利用パターン"""
         
         # テストユーザーの設定
@@ -46,11 +64,11 @@ class TestNewUserDailyWorkflow:
             'id': 1,
             'name': '田中一郎',
             'email': 'tanaka@company.com',
-            'password_hash': generate_password_hash('company123')
+            'password_hash': make_password_hash('company123')
         }
         
-        mock_get_by_email.return_value = user_data
-        mock_get_by_id.return_value = User(user_data['id'], user_data['name'], user_data['email'])
+        self.mock_get_by_email.return_value = user_data
+        self.mock_get_by_id.return_value = User(user_data['id'], user_data['name'], user_data['email'])
         
         # シナリオ: 朝の出社時ログイン
         print("シナリオ開始: 朝の出社時ログイン")
@@ -69,36 +87,35 @@ class TestNewUserDailyWorkflow:
             'password': 'company123'
         }, follow_redirects=True)
         assert response.status_code == 200
-        assert 'ダッシュボード' in response.get_data(as_text=True)
+        assert DASHBOARD_B in response.data
         
         # 4. 日中の複数回ダッシュボードアクセス（業務中の確認）
+        # 本文はデコードせずバイト列のまま検索する
+        user_name_bytes = user_data['name'].encode('utf-8')
         for i in range(5):
             response = client.get('/dashboard')
             assert response.status_code == 200
-            assert '田中一郎' in response.get_data(as_text=True)
-            time.sleep(0.1)  # 短い間隔でのアクセスをシミュレート
+            assert user_name_bytes in response.data
         
         # 5. 終業時のログアウト
         response = client.get('/logout', follow_redirects=True)
         assert response.status_code == 200
-        assert 'Welcome to Flask with MySQL' in response.get_data(as_text=True)
+        assert WELCOME_B in response.data
         
         print("シナリオ完了: 正常な一日の業務フロー")
     
-    @patch('app.User.get_user_by_id')
-    @patch('app.User.get_user_by_email')
-    def test_interrupted_workflow_with_session_timeout(self, mock_get_by_email, mock_get_by_id, client):
+    def test_interrupted_workflow_with_session_timeout(self, client, make_password_hash):
         """セッションタイムアウトを含む中断されたワークフロー"""
         
         user_data = {
             'id': 2,
             'name': '鈴木次郎',
             'email': 'suzuki@company.com',
-            'password_hash': generate_password_hash('secure456')
+            'password_hash': make_password_hash('secure456')
         }
         
-        mock_get_by_email.return_value = user_data
-        mock_get_by_id.return_value = User(user_data['id'], user_data['name'], user_data['email'])
+        self.mock_get_by_email.return_value = user_data
+        self.mock_get_by_id.return_value = User(user_data['id'], user_data['name'], user_data['email'])
         
         # シナリオ: 長時間の離席後の再アクセス
         print("シナリオ開始: 長時間離席後の再アクセス")
@@ -113,7 +130,7 @@ class TestNewUserDailyWorkflow:
         # 2. ダッシュボード確認
         response = client.get('/dashboard')
         assert response.status_code == 200
-        assert '鈴木次郎' in response.get_data(as_text=True)
+        assert '鈴木次郎'.encode('utf-8') in response.data
         
         # 3. セッションクリア（長時間離席をシミュレート）
         with client.session_transaction() as sess:
@@ -122,7 +139,7 @@ class TestNewUserDailyWorkflow:
         # 4. ダッシュボードに再アクセス（ログインが必要になる）
         response = client.get('/dashboard', follow_redirects=True)
         assert response.status_code == 200
-        assert 'ログイン' in response.get_data(as_text=True)
+        assert LOGIN_JP_B in response.data
         
         # 5. 再ログイン
         response = client.post('/login', data={
@@ -130,7 +147,7 @@ class TestNewUserDailyWorkflow:
             'password': 'secure456'
         }, follow_redirects=True)
         assert response.status_code == 200
-        assert 'ダッシュボード' in response.get_data(as_text=True)
+        assert DASHBOARD_B in response.data
         
         print("シナリオ完了: セッションタイムアウト後の再認証")
 
@@ -138,36 +155,48 @@ class TestNewUserDailyWorkflow:
 class TestMultipleUserScenarios:
     """複数ユーザーのシナリオテスト"""
     
-    def test_concurrent_user_access(self, client):
+    def test_concurrent_user_access(self, client, make_password_hash):
         """複数ユーザーの同時アクセス"""
         
+        # 複数ユーザーの同時ログイン試行
+        users = [
+            ('user1@test.com', 'pass1', 'ユーザー1'),
+            ('user2@test.com', 'pass2', 'ユーザー2'),
+            ('user3@test.com', 'pass3', 'ユーザー3'),
+            ('user4@test.com', 'pass4', 'ユーザー4'),
+            ('user5@test.com', 'pass5', 'ユーザー5'),
+        ]
+        
+        # ユーザーデータとUserオブジェクトはスレッド開始前に用意しておく
+        users_by_email = {}
+        users_by_id = {}
+        for user_email, password, user_name in users:
+            user_data = {
+                'id': hash(user_email) % 1000,  # 簡単なID生成
+                'name': user_name,
+                'email': user_email,
+                'password_hash': make_password_hash(password)
+            }
+            users_by_email[user_email] = user_data
+            users_by_id[str(user_data['id'])] = User(user_data['id'], user_data['name'], user_data['email'])
+        
         def simulate_user_session(user_email, password, user_name):
             """ユーザーセッションをシミュレート"""
             try:
-                with patch('app.User.get_user_by_email') as mock_get_by_email, \
-                     patch('app.User.get_user_by_id') as mock_get_by_id:
-                    
-                    user_data = {
-                        'id': hash(user_email) % 1000,  # 簡単なID生成
-                        'name': user_name,
-                        'email': user_email,
-                        'password_hash': generate_password_hash(password)
-                    }
-                    
-                    mock_get_by_email.return_value = user_data
-                    mock_get_by_id.return_value = User(user_data['id'], user_data['name'], user_data['email'])
-                    
-                    # ログイン試行
-                    response = client.post('/login', data={
-                        'email': user_email,
-                        'password': password
-                    })
-                    
-                    return {
-                        'user': user_name,
-                        'status_code': response.status_code,
-                        'success': response.status_code in [200, 302]
-                    }
+                # テストクライアントはスレッド間で共有できないため、ユーザー毎に用意する
+                user_client = app.test_client()
+                
+                # ログイン試行
+                response = user_client.post('/login', data={
+                    'email': user_email,
+                    'password': password
+                })
+                
+                return {
+                    'user': user_name,
+                    'status_code': response.status_code,
+                    'success': response.status_code in [200, 302]
+                }
             except Exception as e:
                 return {
                     'user': user_name,
@@ -176,22 +205,16 @@ class TestMultipleUserScenarios:
                     'error': str(e)
                 }
         
-        # 複数ユーザーの同時ログイン試行
-        users = [
-            ('user1@test.com', 'pass1', 'ユーザー1'),
-            ('user2@test.com', 'pass2', 'ユーザー2'),
-            ('user3@test.com', 'pass3', 'ユーザー3'),
-            ('user4@test.com', 'pass4', 'ユーザー4'),
-            ('user5@test.com', 'pass5', 'ユーザー5'),
-        ]
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [
-                executor.submit(simulate_user_session, email, password, name)
-                for email, password, name in users
-            ]
-            
-            results = [future.result() for future in concurrent.futures.as_completed(futures)]
+        # モックはスレッド内で差し替えると競合するため、全スレッド共通で一度だけ設定する
+        with patch('app.User.get_user_by_email', side_effect=users_by_email.get), \
+             patch('app.User.get_user_by_id', side_effect=users_by_id.get):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+                futures = [
+                    executor.submit(simulate_user_session, email, password, name)
+                    for email, password, name in users
+                ]
+                
+                results = [future.result() for future in concurrent.futures.as_completed(futures)]
         
         # 結果の検証
         successful_logins = [r for r in results if r['success']]
@@ -200,59 +223,55 @@ class TestMultipleUserScenarios:
         print(f"同時ログインテスト完了: {len(successful_logins)}/{len(users)} 成功")
 
 
-class TestSecurityScenarios:
+class TestSecurityScenarios(MockedUserLookupMixin):
     """セキュリティシナリオテスト"""
     
-    @patch('app.User.get_user_by_email')
-    def test_brute_force_attack_simulation(self, mock_get_user, client):
-        """ブルートフォース攻撃のシミュレーション"""
-        
-        # 正しいユーザーデータを設定
-        correct_password = "correct_password"
-        user_data = {
+    # ブルートフォース攻撃でよく使われるパスワード
+    BRUTE_FORCE_PASSWORDS = [
+        '123456', 'password', 'admin', 'qwerty', 'letmein',
+        '12345', 'monkey', 'dragon', '111111', 'baseball'
+    ]
+    BRUTE_FORCE_CORRECT_PASSWORD = "correct_password"
+    
+    @pytest.fixture
+    def brute_force_user_data(self, make_password_hash):
+        """ブルートフォース攻撃の対象となるユーザーデータ"""
+        return {
             'id': 1,
             'name': 'セキュリティテストユーザー',
             'email': 'security@test.com',
-            'password_hash': generate_password_hash(correct_password)
+            'password_hash': make_password_hash(self.BRUTE_FORCE_CORRECT_PASSWORD)
         }
+    
+    @pytest.mark.parametrize('wrong_password', BRUTE_FORCE_PASSWORDS)
+    def test_brute_force_attempt(self, client, brute_force_user_data, wrong_password):
+        """ブルートフォース攻撃のシミュレーション（不正なパスワードでの試行が失敗すること）"""
+        self.mock_get_by_email.return_value = brute_force_user_data
         
-        mock_get_user.return_value = user_data
-        
-        # 間違ったパスワードでの連続試行
-        wrong_passwords = [
-            '123456', 'password', 'admin', 'qwerty', 'letmein',
-            '12345', 'monkey', 'dragon', '111111', 'baseball'
-        ]
-        
-        failed_attempts = 0
-        for wrong_password in wrong_passwords:
-            response = client.post('/login', data={
-                'email': 'security@test.com',
-                'password': wrong_password
-            })
-            
-            if response.status_code == 200 and 'メールアドレスまたはパスワードが正しくありません' in response.get_data(as_text=True):
-                failed_attempts += 1
+        response = client.post('/login', data={
+            'email': 'security@test.com',
+            'password': wrong_password
+        })
         
-        # すべての不正な試行が失敗することを確認
-        assert failed_attempts == len(wrong_passwords)
+        assert response.status_code == 200
+        assert AUTH_FAIL_B in response.data
+    
+    def test_brute_force_correct_password_succeeds(self, client, brute_force_user_data):
+        """ブルートフォース攻撃の対象ユーザーでも正しいパスワードならログインできること"""
+        self.mock_get_by_email.return_value = brute_force_user_data
         
-        # 正しいパスワードでのログインは成功することを確認
         response = client.post('/login', data={
             'email': 'security@test.com',
-            'password': correct_password
+            'password': self.BRUTE_FORCE_CORRECT_PASSWORD
         }, follow_redirects=True)
         
         assert response.status_code == 200
-        assert 'ダッシュボード' in response.get_data(as_text=True)
-        
-        print("ブルートフォース攻撃シミュレーション完了: すべての不正試行を阻止")
+        assert DASHBOARD_B in response.data
     
-    @patch('app.User.get_user_by_email')
-    def test_sql_injection_attempt(self, mock_get_user, client):
+    def test_sql_injection_attempt(self, client):
         """SQLインジェクション攻撃の試行"""
         
-        mock_get_user.return_value = None  # ユーザーが見つからない場合をシミュレート
+        self.mock_get_by_email.return_value = None  # ユーザーが見つからない場合をシミュレート
         
         # 典型的なSQLインジェクションペイロード
         malicious_inputs = [
@@ -271,33 +290,29 @@ class TestSecurityScenarios:
             
             # SQLインジェクションが成功していないことを確認
             assert response.status_code == 200
-            assert 'ダッシュボード' not in response.get_data(as_text=True)
+            assert DASHBOARD_B not in response.data
             
             # エラーメッセージが適切に表示されることを確認
-            response_text = response.get_data(as_text=True)
-            assert ('メールアドレスまたはパスワードが正しくありません' in response_text or
-                    'Invalid email address' in response_text)
+            assert AUTH_FAIL_B in response.data or INVALID_EMAIL_B in response.data
         
         print("SQLインジェクション攻撃テスト完了: すべての攻撃を阻止")
 
 
-class TestPerformanceScenarios:
+class TestPerformanceScenarios(MockedUserLookupMixin):
     """パフォーマンステストシナリオ"""
     
-    @patch('app.User.get_user_by_id')
-    @patch('app.User.get_user_by_email')
-    def test_rapid_successive_requests(self, mock_get_by_email, mock_get_by_id, client):
+    def test_rapid_successive_requests(self, client, make_password_hash, benchmark):
         """連続高速リクエストのパフォーマンステスト"""
         
         user_data = {
             'id': 1,
             'name': 'パフォーマンステストユーザー',
             'email': 'performance@test.com',
-            'password_hash': generate_password_hash('test123')
+            'password_hash': make_password_hash('test123')
         }
         
-        mock_get_by_email.return_value = user_data
-        mock_get_by_id.return_value = User(user_data['id'], user_data['name'], user_data['email'])
+        self.mock_get_by_email.return_value = user_data
+        self.mock_get_by_id.return_value = User(user_data['id'], user_data['name'], user_data['email'])
         
         # ログイン
         client.post('/login', data={
@@ -305,26 +320,31 @@ class TestPerformanceScenarios:
             'password': 'test123'
         })
         
-        # 連続リクエストのパフォーマンス測定
-        start_time = time.time()
-        request_count = 50
+        # 連続リクエストのパフォーマンス測定（ウォームアップ後に10回×10ラウンド計測）
+        status_codes = []
         
-        successful_requests = 0
-        for i in range(request_count):
+        def fetch_dashboard():
             response = client.get('/dashboard')
-            if response.status_code == 200:
-                successful_requests += 1
+            status_codes.append(response.status_code)
+            return response
         
-        end_time = time.time()
-        total_time = end_time - start_time
-        avg_response_time = total_time / request_count
+        if benchmark.disabled:
+            # pytest-xdist での並列実行時は pytest-benchmark が計測を無効にするため、
+            # 同じ回数のリクエストだけを行い応答の確認のみ実施する
+            for _ in range(100):
+                fetch_dashboard()
+        else:
+            benchmark.pedantic(fetch_dashboard, iterations=10, rounds=10, warmup_rounds=2)
         
         # パフォーマンス基準の確認
-        assert successful_requests == request_count, "すべてのリクエストが成功する必要があります"
-        assert avg_response_time < 0.5, f"平均応答時間が遅すぎます: {avg_response_time:.3f}秒"
-        assert total_time < 10, f"総実行時間が長すぎます: {total_time:.3f}秒"
-        
-        print(f"パフォーマンステスト完了: {request_count}リクエスト, 平均{avg_response_time:.3f}秒/リクエスト")
+        assert len(status_codes) >= 100
+        assert all(code == 200 for code in status_codes), "すべてのリクエストが成功する必要があります"
+        
+        # 応答時間の基準は計測が有効な場合（-n 0 での実行時）のみ確認する
+        if not benchmark.disabled:
+            mean_response_time = benchmark.stats['mean']
+            assert mean_response_time < 0.5, f"平均応答時間が遅すぎます: {mean_response_time:.3f}秒"
+            print(f"パフォーマンステスト完了: {len(status_codes)}リクエスト, 平均{mean_response_time:.3f}秒/リクエスト")
 
 
 if __name__ == '__main__':
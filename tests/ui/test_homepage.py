@@ -1,20 +1,26 @@
 import json
 import os
+import re
 import time
 import urllib.error
 import urllib.request
 
 import pytest
+import requests
 from selenium import webdriver
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
+# The Selenium server allows a single session, so browser tests share one worker.
+pytestmark = pytest.mark.xdist_group("browser")
+
 
 def _wait_for_http(url: str, timeout: int = 60, expect_json: bool = False) -> bool:
     """Poll the given URL until it responds or the timeout is reached."""
     deadline = time.time() + timeout
+    delay = 0.25
     while time.time() < deadline:
         try:
             with urllib.request.urlopen(url) as response:
@@ -22,10 +28,29 @@ def _wait_for_http(url: str, timeout: int = 60, expect_json: bool = False) -> bo
                     json.loads(response.read().decode("utf-8"))
                 return True
         except (urllib.error.URLError, urllib.error.HTTPError, json.JSONDecodeError):
-            time.sleep(2)
+            time.sleep(delay)
+            delay = min(delay * 2, 2)
     return False
 
 
+def _login_cookie(settings, email: str, password: str) -> str:
+    """Log in over HTTP and return the resulting Flask session cookie value."""
+    with requests.Session() as http:
+        login_url = f"{settings['app_url']}/login"
+        login_page = http.get(login_url, timeout=10)
+        login_page.raise_for_status()
+        # The login form is CSRF protected, so reuse the token from the rendered page.
+        csrf_token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', login_page.text).group(1)
+        response = http.post(
+            login_url,
+            data={"csrf_token": csrf_token, "email": email, "password": password},
+            allow_redirects=False,
+            timeout=10,
+        )
+        assert response.status_code == 302, f"HTTP login failed: status={response.status_code}"
+        return http.cookies["session"]
+
+
 @pytest.fixture(scope="session")
 def settings():
     return {
@@ -34,7 +59,22 @@ def settings():
     }
 
 
-@pytest.fixture(scope="function")
+# Chrome options are built once at import time and reused for the session.
+CHROME_OPTIONS = webdriver.ChromeOptions()
+for _argument in (
+    "--headless",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--window-size=1280,720",
+    "--ignore-certificate-errors",
+    "--allow-insecure-localhost",
+    "--disable-features=HttpsOnlyMode,HttpsUpgrades,HttpsFirstMode,HttpsFirstModeV2",
+):
+    CHROME_OPTIONS.add_argument(_argument)
+
+
+@pytest.fixture(scope="session")
 def driver(settings):
     selenium_status = settings["selenium_url"].split("/wd/hub", 1)[0] + "/status"
     if not _wait_for_http(selenium_status, expect_json=True):
@@ -44,24 +84,22 @@ def driver(settings):
     if not _wait_for_http(settings["app_url"]):
         pytest.skip("Flask app is not reachable; skipping UI tests.")
 
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--window-size=1280,720")
-    options.add_argument("--ignore-certificate-errors")
-    options.add_argument("--allow-insecure-localhost")
-    options.add_argument(
-        "--disable-features=HttpsOnlyMode,HttpsUpgrades,HttpsFirstMode,HttpsFirstModeV2"
-    )
     driver = webdriver.Remote(
         command_executor=settings["selenium_url"],
-        options=options,
+        options=CHROME_OPTIONS,
     )
 
     yield driver
     driver.quit()
 
 
+@pytest.fixture(autouse=True)
+def _clean_cookies(driver):
+    """Clear cookies after each test so the shared browser starts logged out."""
+    yield
+    driver.delete_all_cookies()
+
+
 def test_homepage_renders(driver, settings):
     driver.get(settings["app_url"])
 
@@ -140,16 +178,11 @@ def test_login_functionality(driver, settings):
 
 def test_logout_functionality(driver, settings):
     """ログアウト機能のUIテスト"""
-    driver.get(f"{settings['app_url']}/login")
-    
-    email_field = WebDriverWait(driver, 10).until(
-        EC.presence_of_element_located((By.NAME, "email"))
-    )
-    password_field = driver.find_element(By.NAME, "password")
-    
-    email_field.send_keys("sato@example.com")
-    password_field.send_keys("password123")
-    driver.find_element(By.CSS_SELECTOR, "input[type='submit']").click()
+    # ログインはHTTPで済ませ、セッションCookieをブラウザに設定する
+    session_cookie = _login_cookie(settings, "sato@example.com", "password123")
+    driver.get(settings["app_url"])
+    driver.add_cookie({"name": "session", "value": session_cookie, "path": "/"})
+    driver.get(f"{settings['app_url']}/dashboard")
     
     # ダッシュボードでログアウトボタンをクリック
     try:
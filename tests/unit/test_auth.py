@@ -15,12 +15,21 @@ from werkzeug.security import generate_password_hash, check_password_hash
 # アプリケーションのパスを追加
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../app'))
 
-from app import User, app
+from app import (
+    User, app, load_user, hash_password, verify_password, safe_eq, password_needs_rehash,
+    create_test_users, ensure_test_users, LoginForm, _select_db_driver,
+)
 
 
 class TestUser:
     """Userクラスの単体テスト"""
     
+    @pytest.fixture
+    def mock_conn(self):
+        """engine.connect() で得られる接続のモック（クエリ結果は mappings().first() で設定する）"""
+        with patch('app.engine') as mock_engine:
+            yield mock_engine.connect.return_value.__enter__.return_value
+    
     def test_user_initialization(self):
         """ユーザーオブジェクトの初期化テスト"""
         user = User(1, "テストユーザー", "test@example.com")
@@ -29,15 +38,12 @@ class TestUser:
         assert user.email == "test@example.com"
         assert user.is_active is True  # UserMixinのデフォルト
     
-    @patch('app.pymysql.connect')
-    def test_get_user_by_email_success(self, mock_connect):
+    def test_get_user_by_email_success(self, mock_conn):
         """メールアドレスでのユーザー取得成功テスト"""
         # モックの設定
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
-        mock_conn.cursor.return_value = mock_cursor
-        mock_cursor.fetchone.return_value = (1, "テストユーザー", "test@example.com", "hashed_password")
+        mock_conn.execute.return_value.mappings.return_value.first.return_value = {
+            'id': 1, 'name': "テストユーザー", 'email': "test@example.com", 'password_hash': "hashed_password"
+        }
         
         # テスト実行
         result = User.get_user_by_email("test@example.com")
@@ -50,20 +56,15 @@ class TestUser:
         assert result['password_hash'] == "hashed_password"
         
         # データベース呼び出しの確認
-        mock_cursor.execute.assert_called_once_with(
-            'SELECT id, name, email, password_hash FROM users WHERE email = %s', 
-            ("test@example.com",)
-        )
+        mock_conn.execute.assert_called_once()
+        query, params = mock_conn.execute.call_args[0]
+        assert str(query) == 'SELECT id, name, email, password_hash FROM users WHERE email = :email'
+        assert params == {'email': "test@example.com"}
     
-    @patch('app.pymysql.connect')
-    def test_get_user_by_email_not_found(self, mock_connect):
+    def test_get_user_by_email_not_found(self, mock_conn):
         """メールアドレスでのユーザー取得失敗テスト"""
         # モックの設定
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
-        mock_conn.cursor.return_value = mock_cursor
-        mock_cursor.fetchone.return_value = None
+        mock_conn.execute.return_value.mappings.return_value.first.return_value = None
         
         # テスト実行
         result = User.get_user_by_email("nonexistent@example.com")
@@ -71,11 +72,11 @@ class TestUser:
         # アサーション
         assert result is None
     
-    @patch('app.pymysql.connect')
-    def test_get_user_by_email_database_error(self, mock_connect):
+    @patch('app.engine')
+    def test_get_user_by_email_database_error(self, mock_engine):
         """データベースエラー時のテスト"""
         # モックの設定（例外を発生させる）
-        mock_connect.side_effect = Exception("Database connection failed")
+        mock_engine.connect.side_effect = Exception("Database connection failed")
         
         # テスト実行
         result = User.get_user_by_email("test@example.com")
@@ -83,15 +84,27 @@ class TestUser:
         # アサーション
         assert result is None
     
-    @patch('app.pymysql.connect')
-    def test_get_user_by_id_success(self, mock_connect):
+    def test_get_user_by_email_not_cached(self, mock_conn):
+        """メールアドレスでのユーザー取得結果はキャッシュされないことをテスト（ユーザー推測対策）"""
+        # モックの設定
+        mock_conn.execute.return_value.mappings.return_value.first.return_value = {
+            'id': 1, 'name': "テストユーザー", 'email': "test@example.com", 'password_hash': "hashed_password"
+        }
+
+        # 同じメールアドレスで2回取得
+        first = User.get_user_by_email("test@example.com")
+        second = User.get_user_by_email("test@example.com")
+
+        # 毎回データベースへ問い合わせる
+        assert first == second
+        assert mock_conn.execute.call_count == 2
+
+    def test_get_user_by_id_success(self, mock_conn):
         """IDでのユーザー取得成功テスト"""
         # モックの設定
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
-        mock_conn.cursor.return_value = mock_cursor
-        mock_cursor.fetchone.return_value = (1, "テストユーザー", "test@example.com")
+        mock_conn.execute.return_value.mappings.return_value.first.return_value = {
+            'id': 1, 'name': "テストユーザー", 'email': "test@example.com"
+        }
         
         # テスト実行
         result = User.get_user_by_id(1)
@@ -103,15 +116,10 @@ class TestUser:
         assert result.name == "テストユーザー"
         assert result.email == "test@example.com"
     
-    @patch('app.pymysql.connect')
-    def test_get_user_by_id_not_found(self, mock_connect):
+    def test_get_user_by_id_not_found(self, mock_conn):
         """IDでのユーザー取得失敗テスト"""
         # モックの設定
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
-        mock_conn.cursor.return_value = mock_cursor
-        mock_cursor.fetchone.return_value = None
+        mock_conn.execute.return_value.mappings.return_value.first.return_value = None
         
         # テスト実行
         result = User.get_user_by_id(999)
@@ -119,60 +127,267 @@ class TestUser:
         # アサーション
         assert result is None
 
+    def test_get_user_by_id_cached(self, mock_conn):
+        """IDでのユーザー取得結果がキャッシュされることをテスト"""
+        # モックの設定
+        mock_conn.execute.return_value.mappings.return_value.first.return_value = {
+            'id': 1, 'name': "テストユーザー", 'email': "test@example.com"
+        }
+
+        # 同じIDで2回取得
+        first = User.get_user_by_id('1')
+        second = User.get_user_by_id('1')
+
+        # データベースへの問い合わせは1回のみ
+        assert first.name == second.name == "テストユーザー"
+        assert mock_conn.execute.call_count == 1
+
+    @patch('app.engine')
+    def test_update_password_hash_success(self, mock_engine):
+        """パスワードハッシュの更新成功テスト"""
+        mock_conn = mock_engine.begin.return_value.__enter__.return_value
+
+        assert User.update_password_hash(1, '$argon2id$new_hash') is True
+
+        mock_conn.execute.assert_called_once()
+        query, params = mock_conn.execute.call_args[0]
+        assert str(query) == 'UPDATE users SET password_hash = :password_hash WHERE id = :user_id'
+        assert params == {'password_hash': '$argon2id$new_hash', 'user_id': 1}
+
+    @patch('app.engine')
+    def test_update_password_hash_database_error(self, mock_engine):
+        """パスワードハッシュ更新時のデータベースエラーテスト"""
+        mock_engine.begin.side_effect = Exception("Database connection failed")
+
+        assert User.update_password_hash(1, '$argon2id$new_hash') is False
+
+
+class TestLoadUser:
+    """Flask-Loginのユーザー読み込みの単体テスト"""
+
+    @patch('app.User.get_user_by_id')
+    def test_load_user_cached_per_request(self, mock_get_by_id):
+        """同一リクエスト内ではユーザー取得が1回だけ行われることをテスト"""
+        mock_get_by_id.return_value = User(1, "テストユーザー", "test@example.com")
+
+        with app.test_request_context():
+            first = load_user('1')
+            second = load_user('1')
+
+        assert first is second
+        mock_get_by_id.assert_called_once_with('1')
+
+    @patch('app.User.get_user_by_id')
+    def test_load_user_different_id(self, mock_get_by_id):
+        """異なるIDの場合は再取得されることをテスト"""
+        mock_get_by_id.side_effect = [
+            User(1, "ユーザー1", "user1@example.com"),
+            User(2, "ユーザー2", "user2@example.com"),
+        ]
+
+        with app.test_request_context():
+            first = load_user('1')
+            second = load_user('2')
+
+        assert first.id == 1
+        assert second.id == 2
+        assert mock_get_by_id.call_count == 2
+
+
+class TestCreateTestUsers:
+    """テストユーザー作成処理の単体テスト"""
+
+    @patch('app.engine')
+    def test_create_test_users_batch_insert(self, mock_engine):
+        """テストユーザーが1回の一括INSERTで作成されることをテスト"""
+        mock_conn = mock_engine.begin.return_value.__enter__.return_value
+
+        assert create_test_users() is True
+
+        # 一括INSERTが1回だけ実行される
+        mock_conn.execute.assert_called_once()
+        query, rows = mock_conn.execute.call_args[0]
+        assert 'INSERT IGNORE INTO users' in str(query)
+        assert [row['email'] for row in rows] == ['yamada@example.com', 'sato@example.com']
+        assert all(verify_password(row['password_hash'], 'password123') for row in rows)
+
+    @patch('app.engine')
+    def test_create_test_users_database_error(self, mock_engine):
+        """データベースエラー時はFalseを返すことをテスト"""
+        mock_engine.begin.side_effect = Exception("Database connection failed")
+
+        assert create_test_users() is False
+
+    @patch('app.time.sleep')
+    @patch('app.create_test_users')
+    def test_ensure_test_users_exponential_backoff(self, mock_create, mock_sleep):
+        """作成失敗時は指数バックオフで再試行されることをテスト"""
+        mock_create.side_effect = [False, False, False, True]
+
+        assert ensure_test_users() is True
+
+        assert mock_create.call_count == 4
+        assert [c.args[0] for c in mock_sleep.call_args_list] == [0.5, 1.0, 2.0]
+
+    @patch('app.time.sleep')
+    @patch('app.create_test_users')
+    def test_ensure_test_users_gives_up(self, mock_create, mock_sleep):
+        """最大試行回数を超えた場合はFalseを返すことをテスト"""
+        mock_create.return_value = False
+
+        assert ensure_test_users(max_attempts=3) is False
+
+        assert mock_create.call_count == 3
+        assert mock_sleep.call_count == 2
+
+
+class TestSelectDbDriver:
+    """MySQLドライバ選択の単体テスト"""
+
+    @patch('gevent.monkey.is_module_patched', return_value=True)
+    def test_pymysql_under_gevent(self, mock_is_patched):
+        """geventでソケットがパッチされている場合はPyMySQLを使うことをテスト"""
+        assert _select_db_driver() == 'pymysql'
+        mock_is_patched.assert_called_once_with('socket')
+
+    @patch('gevent.monkey.is_module_patched', return_value=False)
+    def test_mysqlclient_preferred(self, mock_is_patched):
+        """mysqlclientが利用可能ならmysqlclientを使うことをテスト"""
+        with patch.dict(sys.modules, {'MySQLdb': MagicMock()}):
+            assert _select_db_driver() == 'mysqldb'
+
+    @patch('gevent.monkey.is_module_patched', return_value=False)
+    def test_pymysql_fallback(self, mock_is_patched):
+        """mysqlclientが無い場合はPyMySQLを使うことをテスト"""
+        with patch.dict(sys.modules, {'MySQLdb': None}):
+            assert _select_db_driver() == 'pymysql'
+
+
+class TestLoginForm:
+    """ログインフォームの単体テスト"""
+
+    def test_login_form_prewarmed(self):
+        """フォームクラスのフィールド定義がインポート時に解決済みであることをテスト"""
+        assert LoginForm._unbound_fields is not None
+        assert LoginForm._wtforms_meta is not None
+        assert [name for name, _ in LoginForm._unbound_fields] == ['email', 'password', 'submit']
+
+
+@pytest.fixture(scope='module')
+def password_hashes(hash_method):
+    """TestPasswordSecurity で共有するハッシュ（同じパスワード2つと異なるパスワード1つ）"""
+    password = "test_password123"
+    other_password = "other_password456"
+    return {
+        'password': password,
+        'same1': generate_password_hash(password, method=hash_method, salt_length=4),
+        'same2': generate_password_hash(password, method=hash_method, salt_length=4),
+        'other': generate_password_hash(other_password, method=hash_method, salt_length=4),
+    }
+
 
 class TestPasswordSecurity:
     """パスワードセキュリティの単体テスト"""
     
-    def test_password_hashing(self):
+    def test_password_hashing(self, password_hashes, hash_method):
         """パスワードハッシュ化テスト"""
-        password = "test_password123"
-        hashed = generate_password_hash(password)
+        hashed = password_hashes['same1']
         
         # ハッシュが生成されることを確認
-        assert hashed != password
+        assert hashed != password_hashes['password']
         assert len(hashed) > 0
-        assert hashed.startswith('pbkdf2:sha256')
+        assert hashed.startswith(hash_method.split(':')[0])
     
-    def test_password_verification_success(self):
+    def test_password_verification_success(self, password_hashes):
         """パスワード検証成功テスト"""
-        password = "test_password123"
-        hashed = generate_password_hash(password)
-        
         # 正しいパスワードで検証
-        assert check_password_hash(hashed, password) is True
+        assert check_password_hash(password_hashes['same1'], password_hashes['password']) is True
     
-    def test_password_verification_failure(self):
+    def test_password_verification_failure(self, password_hashes):
         """パスワード検証失敗テスト"""
-        password = "test_password123"
         wrong_password = "wrong_password"
-        hashed = generate_password_hash(password)
         
         # 間違ったパスワードで検証
-        assert check_password_hash(hashed, wrong_password) is False
+        assert check_password_hash(password_hashes['same1'], wrong_password) is False
     
-    def test_different_passwords_different_hashes(self):
+    def test_different_passwords_different_hashes(self, password_hashes):
         """異なるパスワードで異なるハッシュが生成されることをテスト"""
-        password1 = "password1"
-        password2 = "password2"
-        
-        hash1 = generate_password_hash(password1)
-        hash2 = generate_password_hash(password2)
-        
-        assert hash1 != hash2
+        assert password_hashes['same1'] != password_hashes['other']
     
-    def test_same_password_different_salt(self):
+    def test_same_password_different_salt(self, password_hashes):
         """同じパスワードでも異なるハッシュが生成されることをテスト（ソルト機能）"""
-        password = "test_password"
-        
-        hash1 = generate_password_hash(password)
-        hash2 = generate_password_hash(password)
-        
         # ソルトにより異なるハッシュが生成される
-        assert hash1 != hash2
+        assert password_hashes['same1'] != password_hashes['same2']
         
         # どちらも正しく検証される
-        assert check_password_hash(hash1, password) is True
-        assert check_password_hash(hash2, password) is True
+        assert check_password_hash(password_hashes['same1'], password_hashes['password']) is True
+        assert check_password_hash(password_hashes['same2'], password_hashes['password']) is True
+
+
+class TestArgon2PasswordHashing:
+    """argon2idによるパスワードハッシュの単体テスト"""
+
+    def test_hash_password_uses_argon2id(self):
+        """argon2id形式のハッシュが生成されることをテスト"""
+        hashed = hash_password("test_password123")
+
+        assert hashed.startswith('$argon2id$')
+
+    def test_verify_password_success(self):
+        """argon2idハッシュの検証成功テスト"""
+        hashed = hash_password("test_password123")
+
+        assert verify_password(hashed, "test_password123") is True
+
+    def test_verify_password_failure(self):
+        """argon2idハッシュの検証失敗テスト"""
+        hashed = hash_password("test_password123")
+
+        assert verify_password(hashed, "wrong_password") is False
+
+    def test_verify_password_legacy_werkzeug_hash(self, make_password_hash):
+        """従来のwerkzeug形式のハッシュも検証できることをテスト"""
+        hashed = make_password_hash("test_password123")
+
+        assert verify_password(hashed, "test_password123") is True
+        assert verify_password(hashed, "wrong_password") is False
+
+    def test_verify_password_invalid_hash(self):
+        """不正なargon2ハッシュの場合は検証失敗となることをテスト"""
+        assert verify_password("$argon2id$invalid", "test_password123") is False
+
+    def test_password_needs_rehash_legacy_hash(self, make_password_hash):
+        """従来のwerkzeug形式のハッシュは再ハッシュが必要と判定されることをテスト"""
+        assert password_needs_rehash(make_password_hash("test_password123")) is True
+
+    def test_password_needs_rehash_current_argon2(self):
+        """現在のパラメータのargon2idハッシュは再ハッシュ不要と判定されることをテスト"""
+        assert password_needs_rehash(hash_password("test_password123")) is False
+
+    def test_password_needs_rehash_outdated_argon2(self):
+        """パラメータが異なるargon2idハッシュは再ハッシュが必要と判定されることをテスト"""
+        from argon2 import PasswordHasher
+        outdated = PasswordHasher(time_cost=1, memory_cost=8192, parallelism=1).hash("test_password123")
+
+        assert password_needs_rehash(outdated) is True
+
+
+class TestSafeEq:
+    """秘密値の定数時間比較の単体テスト"""
+
+    def test_safe_eq_equal(self):
+        """同じ値の場合はTrueを返すことをテスト"""
+        assert safe_eq("secret_token", "secret_token") is True
+
+    def test_safe_eq_not_equal(self):
+        """異なる値・長さの場合はFalseを返すことをテスト"""
+        assert safe_eq("secret_token", "secret_tokem") is False
+        assert safe_eq("secret_token", "secret") is False
+
+    def test_safe_eq_non_ascii(self):
+        """ASCII以外の文字も比較できることをテスト"""
+        assert safe_eq("トークン", "トークン") is True
+        assert safe_eq("トークン", "トークソ") is False
 
 
 if __name__ == '__main__':